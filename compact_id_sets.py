@@ -0,0 +1,183 @@
+import struct
+import sys
+from array import array
+from bson import ObjectId, encode, decode
+
+
+OBJECT_ID_SIZE = 12
+
+_HEADER = struct.Struct("<4sIQQ")
+_MAGIC = b"DIS1"
+
+
+class DuplicateGroup:
+    """
+    One duplicate group backed by a slice of the parent id buffer, or by a
+    plain list when its ids are not all ObjectIds.
+    Supports `group["_id"]`, `group["docs"]` and `group["count"]` so code
+    written against the aggregation result dicts keeps working.
+    """
+
+    __slots__ = ("key", "_buffer", "_start", "_end", "_other_ids")
+
+    def __init__(self, key, buffer, start, end, other_ids=None):
+        self.key = key
+        self._buffer = buffer
+        self._start = start
+        self._end = end
+        self._other_ids = other_ids
+
+    def __len__(self):
+        if self._other_ids is not None:
+            return len(self._other_ids)
+        return (self._end - self._start) // OBJECT_ID_SIZE
+
+    def __iter__(self):
+        if self._other_ids is not None:
+            yield from self._other_ids
+            return
+        buffer = self._buffer
+        for offset in range(self._start, self._end, OBJECT_ID_SIZE):
+            yield ObjectId(bytes(buffer[offset:offset + OBJECT_ID_SIZE]))
+
+    def __getitem__(self, name):
+        if name == "_id":
+            return self.key
+        if name == "docs":
+            return list(self)
+        if name == "count":
+            return len(self)
+        raise KeyError(name)
+
+    def ids_to_delete(self):
+        """Every id except the first one, which is the record that is kept."""
+        ids = iter(self)
+        next(ids, None)
+        return ids
+
+
+class DuplicateIdSet:
+    """
+    Compact storage for duplicate groups: raw 12-byte ObjectIds packed into
+    one `bytearray` with an `array` of end offsets per group, instead of a
+    Python list of `ObjectId` objects per group. Groups holding any other
+    `_id` type (strings, ints, ...) keep a plain list in `_other`.
+    """
+
+    __slots__ = ("keys", "_ids", "_offsets", "_other", "_other_count")
+
+    def __init__(self):
+        self.keys = []
+        self._ids = bytearray()
+        self._offsets = array("Q", [0])
+        self._other = {}
+        self._other_count = 0
+
+    @classmethod
+    def from_groups(cls, groups):
+        """Build from aggregation style results: [{"_id": ..., "docs": [...]}]."""
+        id_set = cls()
+        for group in groups:
+            id_set.add_group(group["_id"], group["docs"])
+        return id_set
+
+    def add_group(self, key, doc_ids):
+        doc_ids = list(doc_ids)
+        if all(isinstance(doc_id, ObjectId) for doc_id in doc_ids):
+            for doc_id in doc_ids:
+                self._ids += doc_id.binary
+        else:
+            self._other[len(self.keys)] = doc_ids
+            self._other_count += len(doc_ids)
+        self.keys.append(key)
+        self._offsets.append(len(self._ids))
+
+    # ------------------ Access ------------------
+    def __len__(self):
+        return len(self.keys)
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.keys)
+        return DuplicateGroup(
+            self.keys[index], self._ids, self._offsets[index], self._offsets[index + 1],
+            self._other.get(index)
+        )
+
+    def __iter__(self):
+        for index, key in enumerate(self.keys):
+            yield DuplicateGroup(
+                key, self._ids, self._offsets[index], self._offsets[index + 1],
+                self._other.get(index)
+            )
+
+    @property
+    def id_count(self):
+        return len(self._ids) // OBJECT_ID_SIZE + self._other_count
+
+    @property
+    def delete_count(self):
+        """Ids that would be deleted: all ids minus one kept per group."""
+        return self.id_count - len(self.keys)
+
+    @property
+    def nbytes(self):
+        return len(self._ids) + self._offsets.itemsize * len(self._offsets)
+
+    def ids_to_delete(self):
+        for group in self:
+            yield from group.ids_to_delete()
+
+    def delete_batches(self, batch_size=1000):
+        """Yield lists of at most `batch_size` ids, ready for `{"$in": batch}`."""
+        batch = []
+        for doc_id in self.ids_to_delete():
+            batch.append(doc_id)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def to_groups(self):
+        """Expand back into aggregation style result dicts."""
+        return [{"_id": group.key, "docs": list(group), "count": len(group)} for group in self]
+
+    # ------------------ Serialization ------------------
+    def to_bytes(self):
+        offsets = array("Q", self._offsets)
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        keys = encode({
+            "keys": self.keys,
+            "other": {str(index): ids for index, ids in self._other.items()},
+        })
+        header = _HEADER.pack(_MAGIC, len(self.keys), len(keys), len(self._ids))
+        return b"".join([header, offsets.tobytes(), keys, bytes(self._ids)])
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, group_count, keys_size, ids_size = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC:
+            raise ValueError("❌ Not a serialized DuplicateIdSet.")
+
+        position = _HEADER.size
+        offsets = array("Q")
+        offsets.frombytes(data[position:position + (group_count + 1) * offsets.itemsize])
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        position += (group_count + 1) * offsets.itemsize
+
+        decoded = decode(data[position:position + keys_size])
+        position += keys_size
+
+        id_set = cls()
+        id_set.keys = decoded["keys"]
+        id_set._other = {int(index): ids for index, ids in decoded.get("other", {}).items()}
+        id_set._other_count = sum(len(ids) for ids in id_set._other.values())
+        id_set._offsets = offsets
+        id_set._ids = bytearray(data[position:position + ids_size])
+        return id_set
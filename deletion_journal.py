@@ -0,0 +1,257 @@
+import json
+import os
+import uuid
+from datetime import datetime
+from bson import json_util
+from job_manager import command_options, raise_if_cancelled
+
+
+JOURNAL_DIR = "deletion_journals"
+
+# `plan` records carry the ids and make up nearly all of a journal. Records
+# are written with "type" first, so status scans can skip plans unparsed.
+_PLAN_PREFIX = '{"type": "plan"'
+
+# path -> ((size, mtime_ns), pending run id); journals are append-only, so
+# an unchanged size and mtime means an unchanged status.
+_STATUS_CACHE = {}
+
+
+class DeletionJournal:
+    """
+    Append-only write-ahead journal for one `<db>.<collection>`.
+
+    Every deletion run writes a `begin` record and one `plan` record per
+    batch (with the ids it will delete) before anything is removed, then a
+    `commit` record after each batch is acknowledged and an `end` record
+    when the run completes. Every append is fsynced, so after a crash the
+    unfinished run can be replayed from the last committed batch.
+    The file also serves as an audit trail of every deleted id.
+
+    `cluster_id` identifies the cluster the ids belong to. It is written
+    into each `begin` record, and a pending run is only replayed against
+    the same cluster.
+    """
+
+    def __init__(self, database_name, collection_name, directory=JOURNAL_DIR, cluster_id=None):
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.cluster_id = cluster_id
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{database_name}.{collection_name}.journal")
+
+    @classmethod
+    def existing(cls, directory=JOURNAL_DIR, cluster_id=None):
+        """Journals already on disk, one per `<db>.<collection>`."""
+        if not os.path.isdir(directory):
+            return []
+        journals = []
+        for fname in sorted(os.listdir(directory)):
+            if not fname.endswith(".journal"):
+                continue
+            database_name, collection_name = fname[:-len(".journal")].split(".", 1)
+            journals.append(cls(database_name, collection_name, directory, cluster_id))
+        return journals
+
+    # ------------------ Writing ------------------
+    def _repair_tail(self):
+        """
+        Drop a torn last line left by a crash mid-write, so the next record
+        starts on its own line instead of being glued to the torn one.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r+b") as handle:
+            size = handle.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            handle.seek(size - 1)
+            if handle.read(1) == b"\n":
+                return
+
+            position = size
+            while position > 0:
+                step = min(65536, position)
+                position -= step
+                handle.seek(position)
+                newline = handle.read(step).rfind(b"\n")
+                if newline != -1:
+                    position += newline + 1
+                    break
+            print(f"⚠️ Dropping torn journal record at byte {position} of {self.path}")
+            handle.truncate(position)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def _append(self, *records):
+        at = datetime.now().isoformat(timespec="seconds")
+        self._repair_tail()
+        with open(self.path, "a", encoding="utf-8") as handle:
+            for record in records:
+                record["at"] = at
+                handle.write(json.dumps(record, default=json_util.default) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def begin(self, batches, start_date=None):
+        """Record the full plan of a new run before deleting anything."""
+        run_id = uuid.uuid4().hex
+        records = [{
+            "type": "begin",
+            "run": run_id,
+            "cluster": self.cluster_id,
+            "start_date": start_date,
+        }]
+        records.extend(
+            {
+                "type": "plan",
+                "run": run_id,
+                "batch": batch_no,
+                # Extended JSON keeps ObjectId, string and int ids distinct.
+                "ids": list(ids),
+            }
+            for batch_no, ids in enumerate(batches)
+        )
+        self._append(*records)
+        return run_id
+
+    def commit(self, run_id, batch_no, deleted_count):
+        self._append({
+            "type": "commit",
+            "run": run_id,
+            "batch": batch_no,
+            "deleted_count": deleted_count,
+        })
+
+    def finish(self, run_id):
+        self._append({"type": "end", "run": run_id})
+
+    # ------------------ Reading ------------------
+    def records(self, skip_plans=False):
+        """
+        Parsed records in order. Ids stay in extended JSON form
+        ({"$oid": ...}); `replay` decodes the ones it needs.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if not line or (skip_plans and line.startswith(_PLAN_PREFIX)):
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write; the record
+                    # it belonged to was never acted on.
+                    continue
+
+    def pending_run_id(self):
+        """
+        Run id of the latest unfinished run, or None. Cheap enough to call
+        on every UI rerun: plan records are skipped unparsed and the result
+        is cached until the file changes.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = _STATUS_CACHE.get(self.path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        run_id = None
+        for record in self.records(skip_plans=True):
+            if record["type"] == "begin":
+                run_id = record["run"]
+            elif record["type"] == "end" and record["run"] == run_id:
+                run_id = None
+        _STATUS_CACHE[self.path] = (signature, run_id)
+        return run_id
+
+    def pending_run(self):
+        """
+        Return (run_id, [(batch_no, ids), ...]) for the latest unfinished
+        run, listing only batches without a commit. Returns (None, []) when
+        every run completed. Raises if the run was planned on a different
+        cluster than this journal's `cluster_id`.
+        """
+        run_id = None
+        cluster_id = None
+        planned = {}
+        committed = set()
+        for record in self.records():
+            if record["type"] == "begin":
+                run_id, planned, committed = record["run"], {}, set()
+                cluster_id = record.get("cluster")
+            elif record.get("run") != run_id:
+                continue
+            elif record["type"] == "plan":
+                planned[record["batch"]] = record["ids"]
+            elif record["type"] == "commit":
+                committed.add(record["batch"])
+            elif record["type"] == "end":
+                run_id, planned, committed = None, {}, set()
+
+        if run_id is None:
+            return None, []
+        if self.cluster_id is not None and cluster_id != self.cluster_id:
+            raise Exception(
+                f"❌ Pending run in {self.path} was planned on cluster "
+                f"{cluster_id or 'unknown'}, not {self.cluster_id}; refusing to replay it."
+            )
+        return run_id, [
+            (batch_no, ids)
+            for batch_no, ids in sorted(planned.items())
+            if batch_no not in committed
+        ]
+
+    def deleted_ids(self):
+        """Audit view: every id whose batch was acknowledged as deleted."""
+        planned = {}
+        for record in self.records():
+            if record["type"] == "plan":
+                planned[(record["run"], record["batch"])] = record["ids"]
+            elif record["type"] == "commit":
+                for doc_id in planned.pop((record["run"], record["batch"]), []):
+                    yield _decode_id(doc_id)
+
+    def audit_lines(self):
+        """
+        "<db>.<collection>\t<_id>" per deleted id. `_id` is rendered with
+        str(), as in the ZIP backups, so the two can be matched directly.
+        """
+        name = f"{self.database_name}.{self.collection_name}"
+        for doc_id in self.deleted_ids():
+            yield f"{name}\t{doc_id}"
+
+    # ------------------ Execution ------------------
+    def replay(self, collection):
+        """Delete every uncommitted batch of the pending run, committing as it goes."""
+        run_id, batches = self.pending_run()
+        if run_id is None:
+            return 0
+
+        deleted = 0
+        for batch_no, ids in batches:
+            # Stopping between batches leaves the run pending and resumable.
+            raise_if_cancelled()
+            ids = [_decode_id(doc_id) for doc_id in ids]
+            # `delete_many` takes the job comment (so killOp finds it) but
+            # no time limit.
+            result = collection.delete_many(
+                {"_id": {"$in": ids}}, comment=command_options().get("comment")
+            )
+            self.commit(run_id, batch_no, result.deleted_count)
+            deleted += result.deleted_count
+
+        self.finish(run_id)
+        return deleted
+
+
+def _decode_id(doc_id):
+    """Extended JSON id from a plan record back to its BSON value."""
+    if isinstance(doc_id, dict):
+        return json_util.object_hook(doc_id)
+    return doc_id
@@ -0,0 +1,172 @@
+import math
+from job_manager import command_options, cursor_options
+from hash_dedupe_engine import (
+    COLLECTION_SPECS, MISSING, HashDedupeEngine, group_key_values, shift_day, key_digest
+)
+
+
+class DuplicateRateEstimator:
+    """
+    Fast triage of duplicate counts from a random sample.
+
+    Draws `$sample` documents from each collection's pre-group population,
+    looks up the size k of every sampled document's duplicate group with
+    one range query over the sampled facilities and days, and extrapolates: a document in a group of size
+    k contributes (k - 1) / k deletions, so the population total times the
+    mean contribution is an unbiased estimate of the exact `delete_count`.
+
+    The confidence interval is a Wilson score interval on the fraction of
+    documents that have a duplicate, scaled by the mean contribution of the
+    hits. Unlike the normal approximation it stays informative when the
+    sample has few or no duplicates: with zero hits the upper bound is
+    about z² / n of the population (rule-of-three territory), not zero.
+
+    Sampling cost: `$sample` only uses the cheap random cursor as the first
+    stage and for under 5% of the collection. When the date window covers
+    enough of the collection, the draw is taken from the whole collection
+    and filtered afterwards; otherwise `$match` runs first and the server
+    reads the whole matched window to sample it, so the cost scales with
+    the matched set rather than the sample size. The group lookup is an
+    index range scan only when the collection has its scan index (see
+    `HashDedupeEngine.create_scan_indexes`), which it hints; without it the
+    lookup is one collection scan, so create the scan indexes before using
+    estimate mode on large tenants.
+    """
+
+    # `$sample` switches from a random cursor to a full scan and sort when
+    # asked for this fraction of the collection or more.
+    RANDOM_CURSOR_FRACTION = 0.05
+
+    def __init__(self, mongo, sample_size=200, z_score=1.96):
+        self.mongo = mongo
+        self.sample_size = sample_size
+        self.z_score = z_score
+
+    def _sample_pipeline(self, db, population_query, population, projection):
+        """
+        Sample first (random cursor) when the draw needed to yield about
+        `sample_size` matches is small enough; match first otherwise.
+        """
+        total = db.estimated_document_count()
+        if total > 0:
+            draw = math.ceil(self.sample_size * total / population)
+            if draw < total * self.RANDOM_CURSOR_FRACTION:
+                return [
+                    {"$sample": {"size": draw}},
+                    {"$match": population_query},
+                    {"$project": projection},
+                ]
+        return [
+            {"$match": population_query},
+            {"$sample": {"size": self.sample_size}},
+            {"$project": projection},
+        ]
+
+    def estimate(self, company_id, spec_name, start_date):
+        spec = COLLECTION_SPECS[spec_name]
+        db = self.mongo[f"{company_id}_Vault"][spec["collection"]]
+        key_fields = spec["key_fields"]
+
+        population_query = dict(spec["match"])
+        population_query["iso_date"] = {"$gte": shift_day(start_date, -2)}
+        population = db.count_documents(population_query, **command_options())
+        if population == 0:
+            return {"estimate": 0, "low": 0, "high": 0, "sampled": 0, "population": 0}
+
+        sample = db.aggregate(
+            self._sample_pipeline(db, population_query, population, spec["projection"]),
+            **command_options()
+        )
+
+        contributions = []
+        lookups = []
+        for doc in sample:
+            try:
+                values = group_key_values(doc, key_fields)
+            except (ValueError, OverflowError):
+                values = None
+            if values is None or values[1] < start_date:
+                contributions.append(0.0)
+                continue
+            lookups.append((key_digest(values), values))
+
+        group_sizes = self._group_sizes(db, spec, lookups)
+        for digest, _ in lookups:
+            size = group_sizes.get(digest, 1)
+            contributions.append((size - 1) / size)
+
+        sampled = len(contributions)
+        if sampled == 0:
+            return {"estimate": 0, "low": 0, "high": 0, "sampled": 0, "population": population}
+        estimate = sum(contributions) / sampled * population
+        if sampled >= population:
+            # The whole window was sampled; the count is exact.
+            low = high = estimate
+        else:
+            hits = [value for value in contributions if value > 0]
+            fraction_low, fraction_high = self._wilson_interval(len(hits), sampled)
+            # With no hits the group sizes are unknown; a contribution of 1
+            # keeps the upper bound conservative.
+            per_hit = sum(hits) / len(hits) if hits else 1.0
+            low = fraction_low * per_hit * population
+            high = fraction_high * per_hit * population
+
+        return {
+            "estimate": round(estimate),
+            "low": max(0, math.floor(min(low, estimate))),
+            "high": math.ceil(max(high, estimate)),
+            "sampled": sampled,
+            "population": population,
+        }
+
+    def _wilson_interval(self, hits, sampled):
+        """Wilson score interval for a binomial proportion."""
+        z2 = self.z_score ** 2
+        proportion = hits / sampled
+        denominator = 1 + z2 / sampled
+        center = (proportion + z2 / (2 * sampled)) / denominator
+        half_width = (
+            self.z_score
+            * math.sqrt(proportion * (1 - proportion) / sampled + z2 / (4 * sampled ** 2))
+            / denominator
+        )
+        return max(0.0, center - half_width), min(1.0, center + half_width)
+
+    def _group_sizes(self, db, spec, lookups):
+        """
+        Exact group size per key digest. One query covers every sampled
+        key: the sampled facilities over the sampled days (with the same
+        two day margin as the scan), filtered exactly by digest here.
+        """
+        if not lookups:
+            return {}
+        wanted = {digest for digest, _ in lookups}
+        members = {digest: set() for digest in wanted}
+
+        days = sorted(values[1] for _, values in lookups)
+        facility_ids = []
+        for _, values in lookups:
+            facility_id = None if values[0] is MISSING else values[0]
+            if facility_id not in facility_ids:
+                facility_ids.append(facility_id)
+
+        query = dict(spec["match"])
+        query["iso_date"] = {"$gte": shift_day(days[0], -2), "$lt": shift_day(days[-1], 2)}
+        query[spec["key_fields"][0][1]] = {"$in": facility_ids}
+
+        cursor = db.find(query, spec["projection"], **cursor_options())
+        if HashDedupeEngine._has_index(db, spec["index"]):
+            cursor = cursor.hint(spec["index"])
+
+        for doc in cursor:
+            try:
+                values = group_key_values(doc, spec["key_fields"])
+            except (ValueError, OverflowError):
+                continue
+            if values is None:
+                continue
+            digest = key_digest(values)
+            if digest in wanted:
+                members[digest].add(doc["_id"])
+
+        return {digest: max(len(ids), 1) for digest, ids in members.items()}
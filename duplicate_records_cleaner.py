@@ -1,9 +1,16 @@
 import json
+import os
+import re
 import zipfile
 from io import BytesIO
-from pymongo import MongoClient, DeleteMany
+from pymongo import MongoClient
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from hash_dedupe_engine import HashDedupeEngine
+from compact_id_sets import DuplicateIdSet
+from duplicate_rate_estimator import DuplicateRateEstimator
+from deletion_journal import DeletionJournal, JOURNAL_DIR
+from job_manager import command_options, cursor_options, raise_if_cancelled
 
 
 class MongoUtils:
@@ -19,16 +26,60 @@ class MongoUtils:
 
         self.__mongo = MongoClient(connection_string)
         self.mongo = self.__mongo
+        self.seed_hosts = self.parse_seed_hosts(connection_string)
 
         print("✅ MongoDB connection established.")
 
+    @staticmethod
+    def parse_seed_hosts(connection_string):
+        """
+        Sorted "host[:port]" seeds from the URI, without credentials or a
+        DNS lookup (an SRV URI yields its single SRV host name).
+        """
+        hosts = connection_string.split("://", 1)[-1]
+        hosts = re.split(r"[/?]", hosts.rsplit("@", 1)[-1], maxsplit=1)[0]
+        return sorted(host.lower() for host in hosts.split(",") if host)
+
 
 class DuplicateCleaner(MongoUtils):
 
-    def __init__(self, connection_string: str):
+    DETECTION_ENGINES = ("server", "client")
+
+    def __init__(self, connection_string: str, detection_engine="server", fetch_companies=True):
         super().__init__(connection_string=connection_string)
-        self.company_ids = self.fetch_active_company_list()
-        print(f"INFO: Active companies fetched: {self.company_ids}")
+        if detection_engine not in self.DETECTION_ENGINES:
+            raise Exception(f"❌ Unknown detection engine: {detection_engine}")
+        # "server" groups with `$group` on the cluster, "client" streams a
+        # narrow projection and groups on this host (see HashDedupeEngine).
+        self.detection_engine = detection_engine
+        self.hash_engine = HashDedupeEngine(self.mongo)
+        self.estimator = DuplicateRateEstimator(self.mongo)
+        self.journal_root = JOURNAL_DIR
+        self._cluster_id = None
+        # fetch_companies=False skips the company aggregation so callers can
+        # run it later (e.g. on a background thread after the UI is up).
+        self.company_ids = []
+        if fetch_companies:
+            self.company_ids = self.fetch_active_company_list()
+            print(f"INFO: Active companies fetched: {self.company_ids}")
+
+    @property
+    def cluster_id(self):
+        """
+        Identity of the connected cluster: the replica set name (if any)
+        and the URI seed hosts, e.g. "rs0@db1:27017,db2:27017". Journals
+        record it, so ids are never replayed against another cluster.
+        """
+        if self._cluster_id is None:
+            set_name = self.mongo.admin.command("hello").get("setName")
+            hosts = ",".join(self.seed_hosts)
+            self._cluster_id = f"{set_name}@{hosts}" if set_name else hosts
+        return self._cluster_id
+
+    @property
+    def journal_dir(self):
+        """Journals live under a per-cluster directory, in every mode."""
+        return os.path.join(self.journal_root, re.sub(r"[^A-Za-z0-9._-]+", "_", self.cluster_id))
 
     def fetch_active_company_list(self): 
         print("START FETCHING REQUIRED COMPANY....")
@@ -41,6 +92,9 @@ class DuplicateCleaner(MongoUtils):
 
     # ------------------ Duplicate queries ------------------
     def _field_measurement_duplicates(self, company_id, start_date):
+        if self.detection_engine == "client":
+            return self.hash_engine.field_measurement_duplicates(company_id, start_date)
+
         db = self.mongo[f"{company_id}_Vault"]["live_field_measurements"]
         pipeline = [
             {
@@ -75,9 +129,13 @@ class DuplicateCleaner(MongoUtils):
                 }
             }
         ]
-        return db, list(db.aggregate(pipeline))
+        # A cursor, not a list: groups are packed as they arrive.
+        return db, db.aggregate(pipeline, **command_options())
 
     def _facility_measurement_duplicates(self, company_id, start_date):
+        if self.detection_engine == "client":
+            return self.hash_engine.facility_measurement_duplicates(company_id, start_date)
+
         db = self.mongo[f"{company_id}_Vault"]["live_facility_measurements"]
         pipeline = [
             {
@@ -117,9 +175,13 @@ class DuplicateCleaner(MongoUtils):
                 }
             }
         ]
-        return db, list(db.aggregate(pipeline))
+        # A cursor, not a list: groups are packed as they arrive.
+        return db, db.aggregate(pipeline, **command_options())
 
     def _production_duplicates(self, company_id, start_date):
+        if self.detection_engine == "client":
+            return self.hash_engine.production_duplicates(company_id, start_date)
+
         db = self.mongo[f"{company_id}_Vault"]["live_production"]
         pipeline = [
             {
@@ -162,15 +224,137 @@ class DuplicateCleaner(MongoUtils):
                 }
             }
         ]
-        return db, list(db.aggregate(pipeline))
+        # A cursor, not a list: groups are packed as they arrive.
+        return db, db.aggregate(pipeline, **command_options())
+
+    # ----------------------------------------------------------------------
+    # OPERATION CONTROL
+    # ----------------------------------------------------------------------
+    def kill_operations(self, comment):
+        """
+        Kill server operations tagged with `comment` (the job id), including
+        getMores of their cursors. Returns the number of operations killed.
+        """
+        admin = self.mongo["admin"]
+        operations = admin.aggregate([
+            {"$currentOp": {"allUsers": True}},
+            {"$match": {"$or": [
+                {"command.comment": comment},
+                {"cursor.originatingCommand.comment": comment},
+            ]}},
+        ])
+        killed = 0
+        for operation in operations:
+            admin.command("killOp", op=operation["opid"])
+            killed += 1
+        print(f"🛑 Killed {killed} operations for {comment}")
+        return killed
+
+    # ----------------------------------------------------------------------
+    # SAMPLING ESTIMATE (fast triage, no ids)
+    # ----------------------------------------------------------------------
+    def estimate_company_duplicates(self, company_id, start_date=None):
+        """
+        Estimate delete counts for one company from a random sample.
+        Returns summaries keyed like the preview rows ("fm", "lp", "ffm")
+        with `delete_count` set to the estimate and the confidence interval
+        under "estimate". No ids are collected, so nothing can be deleted
+        from an estimate; run the exact detectors for that.
+        """
+        if start_date is None:
+            start_date = (datetime.now() - relativedelta(months=1)).strftime("%Y-%m-%d")
+
+        summaries = {}
+        for key, spec_name in (
+            ("fm", "field_measurements"),
+            ("lp", "production"),
+            ("ffm", "facility_measurements"),
+        ):
+            estimate = self.estimator.estimate(company_id, spec_name, start_date)
+            summaries[key] = {
+                "company_id": company_id,
+                "delete_count": estimate["estimate"],
+                "duplicates": DuplicateIdSet(),
+                "estimate": estimate,
+            }
+        counts = ", ".join(f"{key}={summary['delete_count']}" for key, summary in summaries.items())
+        print(f"📊 Estimated duplicates for {company_id}: {counts}")
+        return summaries
+
+    # ----------------------------------------------------------------------
+    # JOURNALED DELETION (crash-safe, resumable)
+    # ----------------------------------------------------------------------
+    def _finish_pending_run(self, company_id, collection_name):
+        """
+        Replay an interrupted run on this collection. Must run before the
+        scan: a scan taken earlier may keep an id that run still deletes,
+        and together they would remove every copy of a record.
+        """
+        db = self.mongo[f"{company_id}_Vault"][collection_name]
+        journal = DeletionJournal(db.database.name, db.name, self.journal_dir, self.cluster_id)
+        if journal.pending_run_id() is not None:
+            deleted_count = journal.replay(db)
+            print(f"♻️ Finished interrupted run on {db.database.name}.{db.name}: deleted {deleted_count} records.")
+
+    def _delete_with_journal(self, db, duplicates, start_date):
+        """
+        Plan the batches in the collection's journal, then delete them,
+        committing each batch once the server acknowledges it.
+        """
+        journal = DeletionJournal(db.database.name, db.name, self.journal_dir, self.cluster_id)
+        if journal.pending_run_id() is not None:
+            # Started after our scan; our plan may keep ids it deletes.
+            raise Exception(
+                f"❌ {db.database.name}.{db.name} has an unfinished deletion run; "
+                f"resume it and rescan before deleting."
+            )
+        journal.begin(duplicates.delete_batches(), start_date)
+        return journal.replay(db)
+
+    def pending_deletion_journals(self):
+        """Journals with an unfinished run, e.g. after a crash mid-delete."""
+        return [
+            journal
+            for journal in DeletionJournal.existing(self.journal_dir, self.cluster_id)
+            if journal.pending_run_id() is not None
+        ]
+
+    def resume_deletions(self, company_ids=None):
+        """
+        Replay every unfinished journal (or those of `company_ids`) from
+        its last committed batch, without rescanning.
+        Returns {"<db>.<collection>": deleted_count}.
+        """
+        databases = None if company_ids is None else {f"{company_id}_Vault" for company_id in company_ids}
+        resumed = {}
+        for journal in self.pending_deletion_journals():
+            if databases is not None and journal.database_name not in databases:
+                continue
+            db = self.mongo[journal.database_name][journal.collection_name]
+            deleted_count = journal.replay(db)
+            resumed[f"{journal.database_name}.{journal.collection_name}"] = deleted_count
+            print(f"♻️ Resumed {journal.database_name}.{journal.collection_name}: deleted {deleted_count} records.")
+        return resumed
+
+    def deletion_audit(self):
+        """
+        Every id acknowledged as deleted, across all journals, as
+        "<db>.<collection>\t<_id>" lines for matching against ZIP backups.
+        """
+        lines = []
+        for journal in DeletionJournal.existing(self.journal_dir, self.cluster_id):
+            lines.extend(journal.audit_lines())
+        return lines
 
     # ----------------------------------------------------------------------
     # REMOVE DUPLICATE MEASUREMENTS WITH RETURN SUMMARY SUPPORT
     # ----------------------------------------------------------------------
-    def remove_duplicate_measurements(self, start_date=None, dry_run=True, return_summary=False):
+    def remove_duplicate_measurements(self, start_date=None, dry_run=True, return_summary=False, company_ids=None):
         """
         Removes duplicate field measurement records.
         Returns summary when return_summary=True.
+        Pass company_ids to process specific companies without touching
+        self.company_ids (safe when jobs share one cleaner).
         """
 
         if start_date is None:
@@ -182,29 +366,24 @@ class DuplicateCleaner(MongoUtils):
 
         all_company_summaries = []  # Collect summary per company
 
-        for company_id in self.company_ids:
+        for company_id in (self.company_ids if company_ids is None else company_ids):
 
             print(f"INFO : COMPANY: {company_id}")
-            db, duplicates = self._field_measurement_duplicates(company_id, start_date)
+            if not dry_run:
+                self._finish_pending_run(company_id, "live_field_measurements")
+            db, groups = self._field_measurement_duplicates(company_id, start_date)
+            # Pack ids (12 bytes each) straight from the cursor, so the
+            # ObjectId lists of all groups are never held at once.
+            duplicates = DuplicateIdSet.from_groups(groups)
             print(f"🔍 Found {len(duplicates)} duplicate groups\n")
-
-            bulk_ops = []
-            total_deletions = 0
-
-            for group in duplicates:
-                doc_ids = group["docs"]
-                ids_to_delete = doc_ids[1:]
-
-                if ids_to_delete:
-                    bulk_ops.append(DeleteMany({"_id": {"$in": ids_to_delete}}))
-                    total_deletions += len(ids_to_delete)
+            total_deletions = duplicates.delete_count
 
             if dry_run:
                 print(f"DRY RUN — Would delete {total_deletions} records.\n")
             else:
-                if bulk_ops:
-                    result = db.bulk_write(bulk_ops)
-                    print(f"🗑 Deleted {result.deleted_count} records.")
+                if duplicates:
+                    deleted_count = self._delete_with_journal(db, duplicates, start_date)
+                    print(f"🗑 Deleted {deleted_count} records.")
 
             # --- Return summary per company ---
             summary = {
@@ -221,10 +400,12 @@ class DuplicateCleaner(MongoUtils):
     # ----------------------------------------------------------------------
     # REMOVE DUPLICATE FACILITY MEASUREMENTS WITH RETURN SUMMARY SUPPORT
     # ----------------------------------------------------------------------
-    def remove_duplicate_facility_measurements(self, start_date=None, dry_run=True, return_summary=False):
+    def remove_duplicate_facility_measurements(self, start_date=None, dry_run=True, return_summary=False, company_ids=None):
         """
         Removes duplicate facility measurement records.
         Returns summary when return_summary=True.
+        Pass company_ids to process specific companies without touching
+        self.company_ids (safe when jobs share one cleaner).
         """
 
         if start_date is None:
@@ -236,29 +417,24 @@ class DuplicateCleaner(MongoUtils):
 
         all_company_summaries = []  # Collect summary per company
 
-        for company_id in self.company_ids:
+        for company_id in (self.company_ids if company_ids is None else company_ids):
 
             print(f"INFO : COMPANY: {company_id}")
-            db, duplicates = self._facility_measurement_duplicates(company_id, start_date)
+            if not dry_run:
+                self._finish_pending_run(company_id, "live_facility_measurements")
+            db, groups = self._facility_measurement_duplicates(company_id, start_date)
+            # Pack ids (12 bytes each) straight from the cursor, so the
+            # ObjectId lists of all groups are never held at once.
+            duplicates = DuplicateIdSet.from_groups(groups)
             print(f"🔍 Found {len(duplicates)} duplicate groups\n")
-
-            bulk_ops = []
-            total_deletions = 0
-
-            for group in duplicates:
-                doc_ids = group["docs"]
-                ids_to_delete = doc_ids[1:]
-
-                if ids_to_delete:
-                    bulk_ops.append(DeleteMany({"_id": {"$in": ids_to_delete}}))
-                    total_deletions += len(ids_to_delete)
+            total_deletions = duplicates.delete_count
 
             if dry_run:
                 print(f"DRY RUN — Would delete {total_deletions} records.\n")
             else:
-                if bulk_ops:
-                    result = db.bulk_write(bulk_ops)
-                    print(f"🗑 Deleted {result.deleted_count} records.")
+                if duplicates:
+                    deleted_count = self._delete_with_journal(db, duplicates, start_date)
+                    print(f"🗑 Deleted {deleted_count} records.")
 
             summary = {
                 "company_id": company_id,
@@ -274,7 +450,7 @@ class DuplicateCleaner(MongoUtils):
     # ----------------------------------------------------------------------
     # REMOVE DUPLICATE PRODUCTION RECORDS WITH RETURN SUMMARY SUPPORT
     # ----------------------------------------------------------------------
-    def remove_duplicate_production_records(self, start_date=None, dry_run=True, return_summary=False):
+    def remove_duplicate_production_records(self, start_date=None, dry_run=True, return_summary=False, company_ids=None):
 
         if start_date is None:
             start_date = (datetime.now() - relativedelta(months=1)).strftime("%Y-%m-%d")
@@ -285,29 +461,24 @@ class DuplicateCleaner(MongoUtils):
 
         all_company_summaries = []
 
-        for company_id in self.company_ids:
+        for company_id in (self.company_ids if company_ids is None else company_ids):
 
             print(f"INFO : COMPANY: {company_id}")
-            db, duplicates = self._production_duplicates(company_id, start_date)
+            if not dry_run:
+                self._finish_pending_run(company_id, "live_production")
+            db, groups = self._production_duplicates(company_id, start_date)
+            # Pack ids (12 bytes each) straight from the cursor, so the
+            # ObjectId lists of all groups are never held at once.
+            duplicates = DuplicateIdSet.from_groups(groups)
             print(f"🔍 Found {len(duplicates)} duplicate groups\n")
-
-            bulk_ops = []
-            total_deletions = 0
-
-            for group in duplicates:
-                doc_ids = group["docs"]
-                ids_to_delete = doc_ids[1:]
-
-                if ids_to_delete:
-                    bulk_ops.append(DeleteMany({"_id": {"$in": ids_to_delete}}))
-                    total_deletions += len(ids_to_delete)
+            total_deletions = duplicates.delete_count
 
             if dry_run:
                 print(f"DRY RUN — Would delete {total_deletions} records.\n")
             else:
-                if bulk_ops:
-                    result = db.bulk_write(bulk_ops)
-                    print(f"🗑 Deleted {result.deleted_count} records.")
+                if duplicates:
+                    deleted_count = self._delete_with_journal(db, duplicates, start_date)
+                    print(f"🗑 Deleted {deleted_count} records.")
 
             summary = {
                 "company_id": company_id,
@@ -337,9 +508,13 @@ class DuplicateCleaner(MongoUtils):
         today_str = datetime.now().strftime("%Y-%m-%d")
         zip_filename = f"{company_id}-{today_str}.zip"
 
-        db_fm, fm_duplicates = self._field_measurement_duplicates(company_id, start_date)
-        db_lp, lp_duplicates = self._production_duplicates(company_id, start_date)
-        db_ffm, ffm_duplicates = self._facility_measurement_duplicates(company_id, start_date)
+        # Pack each result as it is detected; detectors return lazy cursors.
+        db_fm, fm_groups = self._field_measurement_duplicates(company_id, start_date)
+        fm_duplicates = DuplicateIdSet.from_groups(fm_groups)
+        db_lp, lp_groups = self._production_duplicates(company_id, start_date)
+        lp_duplicates = DuplicateIdSet.from_groups(lp_groups)
+        db_ffm, ffm_groups = self._facility_measurement_duplicates(company_id, start_date)
+        ffm_duplicates = DuplicateIdSet.from_groups(ffm_groups)
 
         added = False
         buffer = BytesIO()
@@ -347,13 +522,10 @@ class DuplicateCleaner(MongoUtils):
             def add_docs(db, duplicates, label):
                 nonlocal added
                 buffer_lines = []
-                for group in duplicates:
-                    doc_ids = group["docs"]
-                    ids_to_delete = doc_ids[1:]
-                    if ids_to_delete:
-                        for doc_id in ids_to_delete:
-                            full_doc = db.find_one({"_id": doc_id})
-                            buffer_lines.append(json.dumps(full_doc, default=str))
+                for batch in duplicates.delete_batches():
+                    raise_if_cancelled()
+                    for full_doc in db.find({"_id": {"$in": batch}}, **cursor_options()):
+                        buffer_lines.append(json.dumps(full_doc, default=str))
                 if buffer_lines:
                     zip_file.writestr(label, "\n".join(buffer_lines))
                     added = True
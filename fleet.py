@@ -0,0 +1,175 @@
+from concurrent.futures import ThreadPoolExecutor
+from job_manager import (
+    JobManager, DONE, FAILED,
+    connect_cleaner, preview_company, delete_company
+)
+
+
+def parse_cluster_uris(text):
+    """
+    Parse "name = uri" lines (blank lines and # comments ignored) into an
+    ordered {name: uri} dict.
+    """
+    uris = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "=" not in line:
+            raise Exception(f"❌ Expected 'name = uri', got: {line}")
+        name, uri = (part.strip() for part in line.split("=", 1))
+        if not name or not uri:
+            raise Exception(f"❌ Expected 'name = uri', got: {line}")
+        if "/" in name:
+            raise Exception(f"❌ Cluster names cannot contain '/': {name}")
+        if name in uris:
+            raise Exception(f"❌ Duplicate cluster name: {name}")
+        uris[name] = uri
+    return uris
+
+
+class Fleet:
+    """
+    A set of named clusters, each with its own DuplicateCleaner.
+
+    Companies are discovered per cluster via `ea_management.asset_properties`
+    and addressed by label: the plain company id for a single cluster,
+    "cluster/company" otherwise. Work is submitted to a JobManager pool per
+    cluster, so every cluster runs concurrently under its own limit and a
+    sweep takes about as long as the slowest cluster.
+    """
+
+    def __init__(self, named_uris, per_cluster_concurrency=2, detection_engine="server"):
+        if not named_uris:
+            raise Exception("❌ At least one cluster is required.")
+        self.uris = dict(named_uris)
+        self.per_cluster_concurrency = per_cluster_concurrency
+        self.detection_engine = detection_engine
+        self.cleaners = {}
+        self.errors = {}
+
+    @property
+    def multi_cluster(self):
+        return len(self.uris) > 1
+
+    # ------------------ Connection ------------------
+    def connect(self):
+        """
+        Connect to every cluster concurrently and fetch its companies. A
+        cluster that fails is recorded in `self.errors` and left out.
+        """
+        with ThreadPoolExecutor(max_workers=len(self.uris)) as executor:
+            futures = {
+                name: executor.submit(connect_cleaner, uri, detection_engine=self.detection_engine)
+                for name, uri in self.uris.items()
+            }
+        for name, future in futures.items():
+            try:
+                cleaner = future.result()
+            except Exception as e:
+                self.errors[name] = str(e)
+                print(f"❌ Cluster {name} failed to connect: {e}")
+                continue
+            self.cleaners[name] = cleaner
+        print(f"✅ Fleet connected: {len(self.cleaners)}/{len(self.uris)} clusters")
+        return self
+
+    def set_detection_engine(self, detection_engine):
+        self.detection_engine = detection_engine
+        for cleaner in self.cleaners.values():
+            cleaner.detection_engine = detection_engine
+
+    # ------------------ Addressing ------------------
+    def label(self, cluster, company):
+        return f"{cluster}/{company}" if self.multi_cluster else company
+
+    def labels(self):
+        return sorted(
+            self.label(cluster, company)
+            for cluster, cleaner in self.cleaners.items()
+            for company in cleaner.company_ids
+        )
+
+    def resolve(self, label):
+        """Return (cluster, cleaner, company) for a label."""
+        if self.multi_cluster:
+            cluster, company = label.split("/", 1)
+        else:
+            cluster, company = next(iter(self.cleaners)), label
+        return cluster, self.cleaners[cluster], company
+
+    @staticmethod
+    def pool_name(cluster):
+        return f"cluster:{cluster}"
+
+    # ------------------ Scheduling ------------------
+    def submit(self, jobs, kind, label, fn, *args, **kwargs):
+        """Submit `fn(cleaner, company, *args)` to the label's cluster pool."""
+        cluster, cleaner, company = self.resolve(label)
+        pool = self.pool_name(cluster)
+        jobs.add_pool(pool, self.per_cluster_concurrency)
+        return jobs.submit(kind, label, fn, cleaner, company, *args, pool=pool, **kwargs)
+
+    def pending_deletion_journals(self):
+        return [
+            (cluster, journal)
+            for cluster, cleaner in self.cleaners.items()
+            for journal in cleaner.pending_deletion_journals()
+        ]
+
+    def journal_label(self, cluster, journal):
+        """Label of the company a journal belongs to (`<company>_Vault`)."""
+        company = journal.database_name
+        if company.endswith("_Vault"):
+            company = company[:-len("_Vault")]
+        return self.label(cluster, company)
+
+    def resume_deletions(self):
+        resumed = {}
+        for cluster, cleaner in self.cleaners.items():
+            for name, deleted_count in cleaner.resume_deletions().items():
+                resumed[self.label(cluster, name)] = deleted_count
+        return resumed
+
+    def deletion_audit(self):
+        """Deleted-id audit lines from every cluster, prefixed by cluster label."""
+        return [
+            self.label(cluster, line)
+            for cluster, cleaner in self.cleaners.items()
+            for line in cleaner.deletion_audit()
+        ]
+
+    # ------------------ Blocking helpers (scripts) ------------------
+    def _run_all(self, kind, labels, fn, *args, jobs=None, **kwargs):
+        jobs = jobs or JobManager()
+        job_ids = [self.submit(jobs, kind, label, fn, *args, **kwargs) for label in labels]
+        finished = jobs.wait(job_ids)
+        for job in finished:
+            if job.status == FAILED:
+                print(f"❌ {kind} failed for {job.label}: {job.error}")
+        return [job for job in finished if job.status == DONE]
+
+    def sweep(self, start_date, estimate=False, labels=None, jobs=None):
+        """
+        Preview every company on every cluster and return one merged
+        overview: preview rows with "company" set to the label and a
+        "cluster" field, largest total first.
+        """
+        rows = []
+        for job in self._run_all(
+            "preview", self.labels() if labels is None else labels, preview_company, start_date,
+            estimate=estimate, jobs=jobs
+        ):
+            row = job.result
+            row["cluster"] = self.resolve(job.label)[0]
+            row["company"] = job.label
+            rows.append(row)
+        rows.sort(
+            key=lambda row: sum(row[key]["delete_count"] for key in ("fm", "lp", "ffm")),
+            reverse=True
+        )
+        return rows
+
+    def delete(self, labels, start_date, jobs=None):
+        """Journaled deletion for the given labels; returns the labels done."""
+        return [job.label for job in self._run_all("delete", labels, delete_company, start_date, jobs=jobs)]
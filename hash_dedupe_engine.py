@@ -0,0 +1,418 @@
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import groupby
+from datetime import datetime, timedelta
+from dateutil import parser as date_parser
+from dateutil import tz
+from job_manager import cursor_options, raise_if_cancelled
+
+
+CHICAGO_TZ = tz.gettz("America/Chicago")
+
+# Narrow projections streamed from the server. Everything else in the
+# documents stays on the cluster.
+FIELD_MEASUREMENT_PROJECTION = {
+    "_id": 1,
+    "facility_id": 1,
+    "iso_date": 1,
+    "type_related_info.oil_rate": 1,
+    "type_related_info.water_rate": 1,
+    "type_related_info.daily_rate": 1,
+    "type_related_info.gas_rate": 1,
+}
+
+FACILITY_MEASUREMENT_PROJECTION = {
+    "_id": 1,
+    "facility_id": 1,
+    "iso_date": 1,
+    "readings.tubing_pressure": 1,
+    "readings.casing_pressure": 1,
+}
+
+PRODUCTION_PROJECTION = {
+    "_id": 1,
+    "facility_id": 1,
+    "iso_date": 1,
+    "qualifier": 1,
+    "production_stream": 1,
+    "volume": 1,
+}
+
+# Compound indexes for the client-side scan: they serve the `iso_date`
+# range and carry the key fields. Only the field measurement index can
+# cover its projection; the facility and production filters (`$exists` on
+# `readings.*`, `record_date`, `forecast`, ...) still fetch each document.
+# They are not created implicitly, see `create_scan_indexes`; the scan
+# only hints them when they exist.
+FIELD_MEASUREMENT_INDEX = [
+    ("iso_date", 1),
+    ("facility_id", 1),
+    ("type_related_info.oil_rate", 1),
+    ("type_related_info.water_rate", 1),
+    ("type_related_info.daily_rate", 1),
+    ("type_related_info.gas_rate", 1),
+    ("_id", 1),
+]
+
+FACILITY_MEASUREMENT_INDEX = [
+    ("facility_type", 1),
+    ("iso_date", 1),
+    ("facility_id", 1),
+    ("readings.tubing_pressure", 1),
+    ("readings.casing_pressure", 1),
+    ("_id", 1),
+]
+
+PRODUCTION_INDEX = [
+    ("frequency", 1),
+    ("iso_date", 1),
+    ("facility_id", 1),
+    ("qualifier", 1),
+    ("production_stream", 1),
+    ("volume", 1),
+    ("_id", 1),
+]
+
+# Per collection: pre-group `$match`, streamed projection, scan index
+# and the `$group` key as (name, dotted path, wrapped in `$ifNull`).
+COLLECTION_SPECS = {
+    "field_measurements": {
+        "collection": "live_field_measurements",
+        "match": {},
+        "projection": FIELD_MEASUREMENT_PROJECTION,
+        "index": FIELD_MEASUREMENT_INDEX,
+        "key_fields": [
+            ("facility_id", "facility_id", False),
+            ("oil_rate", "type_related_info.oil_rate", True),
+            ("water_rate", "type_related_info.water_rate", True),
+            ("daily_rate", "type_related_info.daily_rate", True),
+            ("gas_rate", "type_related_info.gas_rate", True),
+        ],
+    },
+    "facility_measurements": {
+        "collection": "live_facility_measurements",
+        "match": {
+            "facility_type": "well",
+            "readings.tubing_pressure": {"$exists": True},
+            "readings.casing_pressure": {"$exists": True}
+        },
+        "projection": FACILITY_MEASUREMENT_PROJECTION,
+        "index": FACILITY_MEASUREMENT_INDEX,
+        "key_fields": [
+            ("facility_id", "facility_id", False),
+            ("tubing_pressure", "readings.tubing_pressure", True),
+            ("casing_pressure", "readings.casing_pressure", True),
+        ],
+    },
+    "production": {
+        "collection": "live_production",
+        "match": {
+            "record_date": {"$exists": True, "$ne": None, "$type": "number"},
+            "frequency": "daily",
+            "forecast": {"$exists": False},
+            "project_id": {"$exists": False},
+            "ledger_transaction_id": {"$exists": False}
+        },
+        "projection": PRODUCTION_PROJECTION,
+        "index": PRODUCTION_INDEX,
+        "key_fields": [
+            ("facility_id", "facility_id", False),
+            ("qualifier", "qualifier", False),
+            ("production_stream", "production_stream", False),
+            ("volume", "volume", False),
+        ],
+    },
+}
+
+MISSING = object()
+
+
+@lru_cache(maxsize=65536)
+def convert_prime_iso_date(iso_date):
+    """
+    Client-side equivalent of the `$dateFromString` + `$dateToString`
+    stages: returns the America/Chicago calendar day as YYYY-MM-DD.
+    Naive timestamps are treated as UTC, like the server does.
+    """
+    try:
+        parsed = date_parser.isoparse(iso_date)
+    except ValueError:
+        parsed = date_parser.parse(iso_date)
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz.UTC)
+
+    return parsed.astimezone(CHICAGO_TZ).strftime("%Y-%m-%d")
+
+
+def _lookup(doc, dotted_path):
+    value = doc
+    for part in dotted_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+
+def _encode_value(value):
+    """
+    Encode one key value so that values `$group` treats as equal hash equal
+    (1 == 1.0) while values of different BSON types stay apart (True != 1).
+    """
+    if value is MISSING:
+        return "m"
+    if value is None:
+        return "z"
+    if isinstance(value, bool):
+        return f"b{int(value)}"
+    if isinstance(value, float) and value.is_integer():
+        return f"n{int(value)}"
+    if isinstance(value, (int, float)):
+        return f"n{value!r}"
+    if isinstance(value, str):
+        return f"s{value}"
+    return f"{type(value).__name__}{value!r}"
+
+
+def shift_day(day, days):
+    """Shift a YYYY-MM-DD string by a number of days."""
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def group_key_values(doc, key_fields):
+    """
+    The `$group` key of a projected document as a list of values, with the
+    converted Chicago day at index 1. Returns None when `iso_date` is not a
+    string; raises ValueError when it cannot be parsed.
+    """
+    iso_date = doc.get("iso_date")
+    if not isinstance(iso_date, str):
+        return None
+
+    values = []
+    for _, path, if_null in key_fields:
+        value = _lookup(doc, path)
+        if value is MISSING and if_null:
+            value = None
+        values.append(value)
+    values.insert(1, convert_prime_iso_date(iso_date))
+    return values
+
+
+def key_digest(values):
+    encoded = "\x1f".join(_encode_value(value) for value in values)
+    return blake2b(encoded.encode("utf-8"), digest_size=16).digest()
+
+
+class HashDedupeEngine:
+    """
+    Duplicate detection that runs on the utility host instead of the cluster.
+
+    Streams a narrow projection of each collection and groups duplicate keys
+    locally in a digest-keyed hash table. When the table outgrows
+    `max_in_memory_keys`, records are spilled into hash partitions on disk
+    and each partition is grouped by sorting on the key digest.
+    Results have the same shape as the `$group` based detectors and, like
+    their cursors, are yielded lazily for packing into a DuplicateIdSet.
+    """
+
+    def __init__(self, mongo, max_in_memory_keys=2_000_000, spill_partitions=64,
+                 batch_size=10_000, spill_dir=None):
+        self.mongo = mongo
+        self.max_in_memory_keys = max_in_memory_keys
+        self.spill_partitions = spill_partitions
+        self.batch_size = batch_size
+        self.spill_dir = spill_dir
+
+    # ------------------ Public detectors ------------------
+    def field_measurement_duplicates(self, company_id, start_date):
+        return self._detect(company_id, "field_measurements", start_date)
+
+    def facility_measurement_duplicates(self, company_id, start_date):
+        return self._detect(company_id, "facility_measurements", start_date)
+
+    def production_duplicates(self, company_id, start_date):
+        return self._detect(company_id, "production", start_date)
+
+    def _detect(self, company_id, spec_name, start_date):
+        spec = COLLECTION_SPECS[spec_name]
+        db = self.mongo[f"{company_id}_Vault"][spec["collection"]]
+        return db, self._find_duplicates(
+            db, spec["match"], spec["projection"], spec["index"],
+            spec["key_fields"], start_date
+        )
+
+    def create_scan_indexes(self, company_id):
+        """
+        Create the scan indexes for one company. This is a write on the
+        cluster, so it is never done implicitly; run it from a script or
+        the "Create scan indexes" button once per tenant.
+        """
+        vault = self.mongo[f"{company_id}_Vault"]
+        vault["live_field_measurements"].create_index(FIELD_MEASUREMENT_INDEX)
+        vault["live_facility_measurements"].create_index(FACILITY_MEASUREMENT_INDEX)
+        vault["live_production"].create_index(PRODUCTION_INDEX)
+        print(f"✅ Scan indexes ensured for {company_id}")
+
+    # ------------------ Streaming + grouping ------------------
+    def _stream(self, db, match, projection, index_keys, start_date):
+        """
+        Return a cursor over projected documents. The `iso_date` lower
+        bound is a coarse pre-filter with a two day margin for the Chicago
+        offset; the exact date check happens client side.
+        """
+        query = dict(match)
+        query["iso_date"] = {"$gte": shift_day(start_date, -2)}
+
+        cursor = db.find(query, projection, batch_size=self.batch_size, **cursor_options())
+        if self._has_index(db, index_keys):
+            cursor = cursor.hint(index_keys)
+        return cursor
+
+    @staticmethod
+    def _has_index(db, index_keys):
+        try:
+            return any(
+                list(info["key"]) == index_keys
+                for info in db.index_information().values()
+            )
+        except Exception:
+            return False
+
+    def _find_duplicates(self, db, match, projection, index_keys, key_fields, start_date):
+        seen = {}      # digest -> first _id, for keys seen exactly once
+        groups = {}    # digest -> [key_doc, ids], for keys seen more than once
+        spill = None
+        skipped = 0
+        scanned = 0
+
+        try:
+            for doc in self._stream(db, match, projection, index_keys, start_date):
+                scanned += 1
+                if scanned % self.batch_size == 0:
+                    raise_if_cancelled()
+                try:
+                    values = group_key_values(doc, key_fields)
+                except (ValueError, OverflowError):
+                    skipped += 1
+                    continue
+                if values is None or values[1] < start_date:
+                    continue
+                digest = key_digest(values)
+
+                if spill is not None:
+                    spill.add(digest, doc["_id"], key_fields, values)
+                    continue
+
+                group = groups.get(digest)
+                if group is not None:
+                    group[1].append(doc["_id"])
+                    continue
+
+                first_id = seen.pop(digest, MISSING)
+                if first_id is MISSING:
+                    seen[digest] = doc["_id"]
+                else:
+                    groups[digest] = [_key_doc(key_fields, values), [first_id, doc["_id"]]]
+
+                if len(seen) + len(groups) > self.max_in_memory_keys:
+                    print(f"INFO: spilling duplicate detection for {db.name} to disk")
+                    spill = _SpillPartitions(self.spill_partitions, self.spill_dir)
+                    spill.absorb(seen, groups)
+                    seen, groups = {}, {}
+        except BaseException:
+            # Cancellation or a cursor error mid-scan: release the partition
+            # files and temp directory now rather than at garbage collection.
+            if spill is not None:
+                spill.close()
+            raise
+
+        print(f"🔎 Scanned {scanned} records in {db.database.name}.{db.name}")
+        if skipped:
+            print(f"⚠️ Skipped {skipped} records with unparseable iso_date")
+
+        if spill is not None:
+            with spill:
+                yield from spill.duplicate_groups()
+            return
+
+        # Hand groups out one at a time, dropping each from the table, so
+        # the caller can pack them while this table shrinks.
+        seen.clear()
+        while groups:
+            _, (key_doc, ids) = groups.popitem()
+            yield {"_id": key_doc, "docs": ids, "count": len(ids)}
+
+
+def _key_doc(key_fields, values):
+    """Rebuild the `$group` `_id` document; missing fields are omitted."""
+    names = [name for name, _, _ in key_fields]
+    names.insert(1, "converted_prime_iso_date")
+    return {
+        name: value
+        for name, value in zip(names, values)
+        if value is not MISSING
+    }
+
+
+class _SpillPartitions:
+    """Hash partitions on disk, grouped one partition at a time by sorting."""
+
+    def __init__(self, partitions, spill_dir=None):
+        self.directory = tempfile.TemporaryDirectory(prefix="dedupe-spill-", dir=spill_dir)
+        self.files = [
+            open(os.path.join(self.directory.name, f"part-{idx:03d}.bin"), "wb")
+            for idx in range(partitions)
+        ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for handle in self.files:
+            handle.close()
+        self.directory.cleanup()
+
+    def _write(self, digest, record):
+        handle = self.files[digest[0] % len(self.files)]
+        pickle.dump(record, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def add(self, digest, doc_id, key_fields, values):
+        self._write(digest, (digest, doc_id, _key_doc(key_fields, values)))
+
+    def absorb(self, seen, groups):
+        for digest, doc_id in seen.items():
+            # The key document is only needed once a second id shows up,
+            # which the partition pass detects; store it lazily as None.
+            self._write(digest, (digest, doc_id, None))
+        for digest, (key_doc, ids) in groups.items():
+            for doc_id in ids:
+                self._write(digest, (digest, doc_id, key_doc))
+
+    def duplicate_groups(self):
+        for handle in self.files:
+            handle.close()
+            records = []
+            with open(handle.name, "rb") as reader:
+                while True:
+                    try:
+                        records.append(pickle.load(reader))
+                    except EOFError:
+                        break
+
+            # Stable sort keeps encounter order within a group, so docs[0]
+            # stays the record that is kept, as with `$push`.
+            records.sort(key=lambda record: record[0])
+            for _, members in groupby(records, key=lambda record: record[0]):
+                members = list(members)
+                if len(members) < 2:
+                    continue
+                key_doc = next(record[2] for record in members if record[2] is not None)
+                ids = [record[1] for record in members]
+                yield {"_id": key_doc, "docs": ids, "count": len(ids)}
@@ -0,0 +1,319 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+_context = threading.local()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested."""
+
+
+def current_job():
+    """The job running on this worker thread, or None outside a job."""
+    return getattr(_context, "job", None)
+
+
+def raise_if_cancelled():
+    """Cooperative cancellation point for long loops; no-op outside a job."""
+    job = current_job()
+    if job is not None and job.cancel_requested.is_set():
+        raise JobCancelled(job.id)
+
+
+def command_options():
+    """
+    Extra kwargs for `aggregate`/`count_documents` issued inside a job: the
+    job id as `comment` (so `killOp` can find the operation) and the job's
+    `maxTimeMS`, if any.
+    """
+    job = current_job()
+    if job is None:
+        return {}
+    options = {"comment": job.id}
+    if job.max_time_ms:
+        options["maxTimeMS"] = job.max_time_ms
+    return options
+
+
+def cursor_options():
+    """Same as `command_options`, spelled for `find` cursors."""
+    job = current_job()
+    if job is None:
+        return {}
+    options = {"comment": job.id}
+    if job.max_time_ms:
+        options["max_time_ms"] = job.max_time_ms
+    return options
+
+
+class Job:
+    __slots__ = (
+        "id", "kind", "label", "status", "progress", "partial", "result",
+        "error", "max_time_ms", "submitted_at", "started_at", "finished_at",
+        "collected", "cancel_requested", "_cancel_hooks", "_future",
+    )
+
+    def __init__(self, kind, label, max_time_ms=None):
+        self.id = f"{kind}-{uuid.uuid4().hex[:12]}"
+        self.kind = kind
+        self.label = label
+        self.status = QUEUED
+        self.progress = 0.0
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.max_time_ms = max_time_ms
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.collected = False
+        self.cancel_requested = threading.Event()
+        self._cancel_hooks = []
+        self._future = None
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def report(self, progress, **partial):
+        """Publish progress (0..1) and any partial results so far."""
+        self.progress = progress
+        self.partial.update(partial)
+
+    def on_cancel(self, hook):
+        """Register a callable run when the job is cancelled, e.g. killOp."""
+        self._cancel_hooks.append(hook)
+
+    def cancel(self):
+        """
+        Request cancellation. Hooks (e.g. killOp round trips) run on a
+        background thread, so this returns immediately for the UI.
+        """
+        self.cancel_requested.set()
+        if self._future is not None and self._future.cancel():
+            self.status = CANCELLED
+            self.finished_at = time.time()
+            return
+        if self._cancel_hooks:
+            threading.Thread(
+                target=self._run_cancel_hooks, name=f"cancel-{self.id}", daemon=True
+            ).start()
+
+    def _run_cancel_hooks(self):
+        for hook in list(self._cancel_hooks):
+            try:
+                hook()
+            except Exception as e:
+                print(f"⚠️ Cancel hook failed for {self.id}: {e}")
+
+
+class JobManager:
+    """
+    Runs scans, backups and deletions on worker threads so the UI stays
+    responsive and several companies can be processed at once. Callers
+    submit a function, keep the job id and poll `get`/`jobs`.
+    """
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cleanup-job")
+        self._pools = {}
+        self._pool_limits = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add_pool(self, name, max_workers):
+        """
+        Add a named worker pool with its own concurrency limit, e.g. one per
+        cluster. Adding an existing name with the same limit is a no-op;
+        with a new limit the pool is replaced for new jobs, while jobs
+        already submitted finish on the old one.
+        """
+        with self._lock:
+            if self._pool_limits.get(name) == max_workers:
+                return
+            previous = self._pools.get(name)
+            self._pools[name] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=f"cleanup-{name}"
+            )
+            self._pool_limits[name] = max_workers
+        if previous is not None:
+            print(f"INFO: Pool {name} limit changed to {max_workers}")
+            previous.shutdown(wait=False)
+
+    def submit(self, kind, label, fn, *args, max_time_ms=None, pool=None, **kwargs):
+        """
+        Queue `fn(*args, **kwargs)` and return the job id. While it runs,
+        `current_job()` on the worker thread returns the job. `pool` picks a
+        pool registered with `add_pool`; the default pool is used otherwise.
+        """
+        job = Job(kind, label, max_time_ms=max_time_ms)
+        executor = self._pools[pool] if pool is not None else self._executor
+        with self._lock:
+            self._jobs[job.id] = job
+        job._future = executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    @staticmethod
+    def _run(job, fn, args, kwargs):
+        if job.cancel_requested.is_set():
+            job.status = CANCELLED
+            return
+        _context.job = job
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args, **kwargs)
+            job.progress = 1.0
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = CANCELLED if job.cancel_requested.is_set() else FAILED
+        finally:
+            job.finished_at = time.time()
+            _context.job = None
+
+    # ------------------ Polling ------------------
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self, kind=None):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in jobs if kind is None or job.kind == kind]
+
+    def active(self, kind=None):
+        return [job for job in self.jobs(kind) if job.active]
+
+    def collect(self, kind):
+        """Finished jobs of `kind` not handed out before; each is returned once."""
+        finished = []
+        for job in self.jobs(kind):
+            if not job.active and not job.collected:
+                job.collected = True
+                finished.append(job)
+        return finished
+
+    def wait(self, job_ids, timeout=None):
+        """Block until the given jobs finish (or `timeout` seconds pass)."""
+        futures = [self._jobs[job_id]._future for job_id in job_ids]
+        wait([future for future in futures if future is not None], timeout=timeout)
+        return [self._jobs[job_id] for job_id in job_ids]
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and job.active:
+            job.cancel()
+
+    def cancel_all(self, kind=None):
+        for job in self.active(kind):
+            job.cancel()
+
+    def clear_finished(self):
+        with self._lock:
+            self._jobs = {
+                job_id: job for job_id, job in self._jobs.items()
+                if job.active or not job.collected
+            }
+
+
+# ----------------------------------------------------------------------
+# JOB FUNCTIONS SHARED BY THE STREAMLIT PAGE AND THE DESKTOP APP
+# ----------------------------------------------------------------------
+def _watch(cleaner):
+    """Let cancellation kill this job's server operations."""
+    job = current_job()
+    if job is not None:
+        job.on_cancel(lambda: cleaner.kill_operations(job.id))
+
+
+def connect_cleaner(connection_string, detection_engine="server"):
+    """
+    Build a DuplicateCleaner and fetch the active companies. The Mongo
+    stack (pymongo, bson, dateutil) is imported here, not at app start.
+    """
+    from duplicate_records_cleaner import DuplicateCleaner
+
+    cleaner = DuplicateCleaner(
+        connection_string, detection_engine=detection_engine, fetch_companies=False
+    )
+    raise_if_cancelled()
+    cleaner.company_ids = cleaner.fetch_active_company_list()
+    print(f"INFO: Active companies fetched: {cleaner.company_ids}")
+    # Resolve the cluster identity (one `hello`) here, off the UI thread.
+    print(f"INFO: Cluster identity: {cleaner.cluster_id}")
+    return cleaner
+
+
+def preview_company(cleaner, company, start_date, estimate=False):
+    """Preview row for one company: {"company", "fm", "lp", "ffm"}."""
+    _watch(cleaner)
+    job = current_job()
+    if estimate:
+        row = {"company": company, "estimated": True}
+        row.update(cleaner.estimate_company_duplicates(company, start_date=start_date))
+        return row
+
+    row = {"company": company}
+    steps = (
+        ("fm", cleaner.remove_duplicate_measurements),
+        ("lp", cleaner.remove_duplicate_production_records),
+        ("ffm", cleaner.remove_duplicate_facility_measurements),
+    )
+    for idx, (key, detect) in enumerate(steps):
+        raise_if_cancelled()
+        row[key] = detect(
+            start_date=start_date, dry_run=True, return_summary=True, company_ids=[company]
+        )
+        if job is not None:
+            job.report((idx + 1) / len(steps), **{key: row[key]["delete_count"]})
+    return row
+
+
+def backup_company(cleaner, company, start_date):
+    """Combined ZIP backup for one company: (zip_name, zip_bytes)."""
+    _watch(cleaner)
+    return cleaner.create_combined_backup_zip(
+        company_id=company, start_date=start_date, allow_generation=True
+    )
+
+
+def resume_company(cleaner, company):
+    """Finish interrupted journaled deletions for one company."""
+    _watch(cleaner)
+    return cleaner.resume_deletions(company_ids=[company])
+
+
+def delete_company(cleaner, company, start_date):
+    """Journaled deletion of all three collections for one company."""
+    _watch(cleaner)
+    job = current_job()
+    steps = (
+        cleaner.remove_duplicate_measurements,
+        cleaner.remove_duplicate_production_records,
+        cleaner.remove_duplicate_facility_measurements,
+    )
+    for idx, remove in enumerate(steps):
+        raise_if_cancelled()
+        remove(start_date=start_date, dry_run=False, company_ids=[company])
+        if job is not None:
+            job.report((idx + 1) / len(steps))
+    return company
@@ -0,0 +1,17 @@
+from bson import ObjectId
+from compact_id_sets import DuplicateIdSet
+
+
+def test_round_trip_with_mixed_id_types():
+    groups = [
+        {"_id": {"facility_id": "f1"}, "docs": [ObjectId(), ObjectId(), ObjectId()]},
+        {"_id": {"facility_id": "f2"}, "docs": ["legacy-a", "legacy-b"]},
+        {"_id": {"facility_id": "f3"}, "docs": [7, ObjectId()]},
+    ]
+    id_set = DuplicateIdSet.from_bytes(DuplicateIdSet.from_groups(groups).to_bytes())
+
+    assert id_set.to_groups() == [dict(group, count=len(group["docs"])) for group in groups]
+    assert id_set.delete_count == 4
+    assert [doc_id for batch in id_set.delete_batches(3) for doc_id in batch] == (
+        groups[0]["docs"][1:] + groups[1]["docs"][1:] + groups[2]["docs"][1:]
+    )
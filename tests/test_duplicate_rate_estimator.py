@@ -0,0 +1,66 @@
+from duplicate_rate_estimator import DuplicateRateEstimator
+
+
+class FakeCollection:
+    def __init__(self, docs, total):
+        self.docs = docs
+        self.total = total
+        self.pipelines = []
+        self.lookups = []
+
+    def count_documents(self, query, **kwargs):
+        return len(self.docs)
+
+    def estimated_document_count(self):
+        return self.total
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        return self.docs[:200]
+
+    def find(self, query, projection, **kwargs):
+        self.lookups.append(query)
+        return [doc for doc in self.docs if doc["facility_id"] in query["facility_id"]["$in"]]
+
+
+class FakeMongo:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getitem__(self, name):
+        return {"live_field_measurements": self.collection}
+
+
+def unique_docs(count):
+    return [
+        {"_id": idx, "facility_id": f"f{idx}", "iso_date": "2024-05-02T12:00:00Z"}
+        for idx in range(count)
+    ]
+
+
+def test_no_duplicates_in_sample_still_has_an_upper_bound():
+    collection = FakeCollection(unique_docs(10000), total=10000)
+    result = DuplicateRateEstimator(FakeMongo(collection)).estimate("acme", "field_measurements", "2024-05-01")
+
+    assert result["estimate"] == 0 and result["low"] == 0
+    assert 100 < result["high"] < 250
+    # Draw would be 200 of 10000 (2%), so the random cursor path is used.
+    assert "$sample" in collection.pipelines[0][0]
+    # Group sizes for all 200 sampled keys come from one query.
+    assert len(collection.lookups) == 1
+
+
+def test_group_sizes_count_every_copy():
+    docs = unique_docs(300) + [dict(doc, _id=f"copy-{doc['_id']}") for doc in unique_docs(300)]
+    collection = FakeCollection(docs, total=600)
+    result = DuplicateRateEstimator(FakeMongo(collection)).estimate("acme", "field_measurements", "2024-05-01")
+
+    # Every sampled document is in a group of two, contributing 1/2.
+    assert result["estimate"] == 300
+
+
+def test_narrow_window_matches_before_sampling():
+    collection = FakeCollection(unique_docs(1000), total=1000000)
+    DuplicateRateEstimator(FakeMongo(collection)).estimate("acme", "field_measurements", "2024-05-01")
+
+    assert "$match" in collection.pipelines[0][0]
@@ -0,0 +1,57 @@
+import pytest
+from fleet import Fleet, parse_cluster_uris
+from job_manager import JobManager
+
+
+class FakeCleaner:
+    def __init__(self, company_ids):
+        self.company_ids = company_ids
+
+
+def connected(named_companies):
+    fleet = Fleet({name: f"mongodb://{name}" for name in named_companies})
+    fleet.cleaners = {name: FakeCleaner(companies) for name, companies in named_companies.items()}
+    return fleet
+
+
+def test_parse_cluster_uris_keeps_order_and_skips_comments():
+    text = "# prod\nwest = mongodb://w:27017/?a=b\n\neast=mongodb+srv://e.example.net/\n"
+    assert list(parse_cluster_uris(text).items()) == [
+        ("west", "mongodb://w:27017/?a=b"),
+        ("east", "mongodb+srv://e.example.net/"),
+    ]
+
+
+@pytest.mark.parametrize("text", [
+    "east = a\neast = b",
+    "us/east = mongodb://e",
+    "mongodb://no-name",
+    "east =",
+])
+def test_parse_cluster_uris_rejects_bad_lines(text):
+    with pytest.raises(Exception):
+        parse_cluster_uris(text)
+
+
+def test_multi_cluster_labels_route_to_their_cluster():
+    fleet = connected({"east": ["acme", "globex"], "west": ["acme"]})
+
+    assert fleet.labels() == ["east/acme", "east/globex", "west/acme"]
+    cluster, cleaner, company = fleet.resolve("west/acme")
+    assert (cluster, company) == ("west", "acme")
+    assert cleaner is fleet.cleaners["west"]
+
+
+def test_single_cluster_labels_are_plain_company_ids():
+    fleet = connected({"only": ["acme", "a/b"]})
+
+    assert fleet.labels() == ["a/b", "acme"]
+    assert fleet.resolve("a/b") == ("only", fleet.cleaners["only"], "a/b")
+
+
+def test_sweep_of_no_labels_sweeps_nothing():
+    fleet = connected({"east": ["acme"], "west": ["acme"]})
+    jobs = JobManager()
+
+    assert fleet.sweep("2024-05-01", labels=[], jobs=jobs) == []
+    assert jobs.jobs() == []
@@ -0,0 +1,88 @@
+import pytest
+from hash_dedupe_engine import HashDedupeEngine, convert_prime_iso_date, key_digest
+from job_manager import JobCancelled
+
+
+class FakeCollection:
+    name = "live_production"
+
+    class database:
+        name = "acme_Vault"
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection, batch_size=None, **kwargs):
+        return [doc for doc in self.docs if doc.get("iso_date", "") >= query["iso_date"]["$gte"]]
+
+    def index_information(self):
+        return {}
+
+
+class FakeMongo:
+    def __init__(self, docs):
+        self.collection = FakeCollection(docs)
+
+    def __getitem__(self, name):
+        return {"live_production": self.collection}
+
+
+def production_docs(count=600):
+    return [
+        {
+            "_id": idx,
+            "facility_id": f"f{idx % 40}",
+            "iso_date": f"2024-05-0{1 + idx % 3}T12:00:00Z",
+            # Alternate int and float so 1 and 1.0 must land in one group.
+            "volume": float(idx % 5) if idx % 2 else idx % 5,
+            "qualifier": "a",
+        }
+        for idx in range(count)
+    ]
+
+
+def normalized(groups):
+    return sorted((sorted(group["docs"]), group["count"]) for group in groups)
+
+
+def test_int_and_float_share_a_key():
+    assert key_digest(["f1", "2024-05-01", 1]) == key_digest(["f1", "2024-05-01", 1.0])
+
+
+def test_bool_and_int_do_not_share_a_key():
+    assert key_digest(["f1", "2024-05-01", True]) != key_digest(["f1", "2024-05-01", 1])
+
+
+def test_iso_date_converts_to_chicago_day():
+    assert convert_prime_iso_date("2024-05-02T03:00:00Z") == "2024-05-01"
+    assert convert_prime_iso_date("2024-05-02T12:00:00") == "2024-05-02"
+
+
+def test_spilled_and_in_memory_results_match():
+    docs = production_docs()
+    _, in_memory = HashDedupeEngine(FakeMongo(docs)).production_duplicates("acme", "2024-05-02")
+    _, spilled = HashDedupeEngine(
+        FakeMongo(docs), max_in_memory_keys=5, spill_partitions=4
+    ).production_duplicates("acme", "2024-05-02")
+    in_memory, spilled = list(in_memory), list(spilled)
+
+    assert in_memory
+    assert normalized(spilled) == normalized(in_memory)
+    # docs[0] is the record that is kept, in encounter order as with `$push`.
+    assert all(group["docs"] == sorted(group["docs"]) for group in spilled)
+
+
+def test_spill_is_cleaned_up_when_the_scan_fails(tmp_path):
+    class FailingCollection(FakeCollection):
+        def find(self, query, projection, batch_size=None, **kwargs):
+            yield from super().find(query, projection)[:100]
+            raise JobCancelled("scan")
+
+    mongo = FakeMongo([])
+    mongo.collection = FailingCollection(production_docs())
+    engine = HashDedupeEngine(mongo, max_in_memory_keys=5, spill_partitions=4, spill_dir=str(tmp_path))
+
+    with pytest.raises(JobCancelled) as excinfo:
+        list(engine.production_duplicates("acme", "2024-05-02")[1])
+    # The traceback keeps the scan frame alive, so this is not left to GC.
+    assert excinfo.traceback and list(tmp_path.iterdir()) == []
@@ -0,0 +1,83 @@
+import threading
+from job_manager import (
+    JobManager, JobCancelled, DONE, CANCELLED,
+    command_options, current_job, cursor_options, raise_if_cancelled
+)
+
+
+def test_options_are_empty_outside_a_job():
+    assert current_job() is None
+    assert command_options() == {}
+    assert cursor_options() == {}
+
+
+def test_options_carry_the_job_id_and_time_limit():
+    jobs = JobManager()
+    job_id = jobs.submit("preview", "acme", lambda: (command_options(), cursor_options()), max_time_ms=500)
+    command, cursor = jobs.wait([job_id])[0].result
+
+    assert command == {"comment": job_id, "maxTimeMS": 500}
+    assert cursor == {"comment": job_id, "max_time_ms": 500}
+
+
+def test_cancelling_a_queued_job_never_runs_it():
+    jobs = JobManager(max_workers=1)
+    release = threading.Event()
+    ran = []
+    blocker = jobs.submit("preview", "a", release.wait)
+    queued = jobs.submit("preview", "b", lambda: ran.append(True))
+
+    jobs.cancel(queued)
+    assert jobs.get(queued).status == CANCELLED
+    release.set()
+    jobs.wait([blocker, queued])
+    assert ran == []
+
+
+def test_cancelling_a_running_job_stops_it_and_runs_hooks():
+    jobs = JobManager()
+    started, hooked = threading.Event(), threading.Event()
+
+    def work():
+        current_job().on_cancel(hooked.set)
+        started.set()
+        while True:
+            raise_if_cancelled()
+            hooked.wait(0.01)
+
+    job_id = jobs.submit("delete", "acme", work)
+    started.wait()
+    jobs.cancel(job_id)
+
+    assert jobs.wait([job_id])[0].status == CANCELLED
+    assert hooked.wait(1)
+
+
+def test_job_cancelled_maps_to_cancelled():
+    def work():
+        raise JobCancelled("stop")
+
+    jobs = JobManager()
+    assert jobs.wait([jobs.submit("zip", "acme", work)])[0].status == CANCELLED
+
+
+def test_collect_returns_each_finished_job_once():
+    jobs = JobManager()
+    job_ids = [jobs.submit("preview", label, lambda: None) for label in ("a", "b")]
+    jobs.wait(job_ids)
+
+    assert {job.id for job in jobs.collect("preview")} == set(job_ids)
+    assert all(job.status == DONE for job in jobs.jobs())
+    assert jobs.collect("preview") == []
+
+
+def test_pool_limit_change_replaces_the_pool():
+    jobs = JobManager()
+    jobs.add_pool("cluster:east", 1)
+    first = jobs._pools["cluster:east"]
+    jobs.add_pool("cluster:east", 1)
+    assert jobs._pools["cluster:east"] is first
+
+    jobs.add_pool("cluster:east", 3)
+    assert jobs._pools["cluster:east"] is not first
+    assert jobs._pools["cluster:east"]._max_workers == 3